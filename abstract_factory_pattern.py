@@ -106,11 +106,18 @@ class FranceFormatterFactory:
         return FranceCurrencyFormatter()
 
 
-country_code = "US"
-
 factory_map = {
     "US": USAFormatterFactory,
     "FR": FranceFormatterFactory
 }
 
-formatter_factory = factory_map.get(country_code)()
\ No newline at end of file
+
+def get_formatter_factory(country_code):
+    return factory_map.get(country_code)()
+
+
+if __name__ == "__main__":
+    country_code = "US"
+    formatter_factory = get_formatter_factory(country_code)
+    print(formatter_factory.create_date_formatter().format_date(20, 10, 31))
+    print(formatter_factory.create_currency_formatter().format_currency(1234567, 8))
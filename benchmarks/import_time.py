@@ -0,0 +1,96 @@
+"""
+Guards the cold start cost of the pattern modules.
+
+Every module is imported in a fresh interpreter, from an empty working directory.
+The check fails if an import takes longer than the budget, prints anything,
+or leaves files behind (like template_pattern used to create sales.db).
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 10 --repeat 10
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULE_PATHS = [
+    REPO,
+    os.path.join(REPO, "state_pattern"),
+    os.path.join(REPO, "template_pattern"),
+]
+
+MODULES = [
+    "abstract_factory_pattern",
+    "adapter_pattern",
+    "command_pattern",
+    "composite_pattern",
+    "decorator_pattern",
+    "facade_pattern",
+    "flyweight_pattern",
+    "iterator_pattern",
+    "observer_pattern",
+    "singleton_pattern",
+    "state_pattern",
+    "strategy_pattern",
+    "template_pattern",
+]
+
+# Runs in the child, prints how long the import took as the last line of output
+TIME_IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def time_import(module):
+    """Returns (milliseconds, anything else the import printed, files it created)"""
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(MODULE_PATHS), PYTHONDONTWRITEBYTECODE="1")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run([sys.executable, "-c", TIME_IMPORT.format(module=module)],
+                                cwd=workdir, env=env, capture_output=True, text=True, check=True)
+        created = os.listdir(workdir)
+
+    *printed, milliseconds = result.stdout.splitlines()
+    return float(milliseconds), printed, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=25.0, help="slowest allowed import, in milliseconds")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module, the fastest one counts")
+    args = parser.parse_args()
+
+    failures = []
+    for module in MODULES:
+        runs = [time_import(module) for _ in range(args.repeat)]
+        milliseconds = min(run[0] for run in runs)
+        _, printed, created = runs[0]
+
+        problems = []
+        if milliseconds > args.budget_ms:
+            problems.append(f"over the {args.budget_ms}ms budget")
+        if printed:
+            problems.append(f"printed {len(printed)} lines")
+        if created:
+            problems.append(f"created {', '.join(created)}")
+
+        print(f"{module:<26} {milliseconds:8.2f}ms  {'; '.join(problems) or 'ok'}")
+        if problems:
+            failures.append(module)
+
+    if failures:
+        print(f"\n{len(failures)} module(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
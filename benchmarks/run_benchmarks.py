@@ -0,0 +1,411 @@
+"""
+Benchmarks the hot path of every pattern module.
+
+Each scenario builds its input once, then times a number of iterations of the
+same piece of work. For each one it reports throughput, latency percentiles of
+an iteration, and peak memory allocated while running one (measured in a
+separate run, since tracemalloc slows everything down).
+
+Results can be saved as JSON and compared against an earlier run:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+    python benchmarks/run_benchmarks.py --only composite_get_path iterator_indexed --scale 10
+"""
+
+import argparse
+import atexit
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from import_time import MODULE_PATHS
+
+sys.path[:0] = MODULE_PATHS
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    """
+    Register a scenario. It takes the scale and returns (run, items), where run()
+    does one iteration's work on items things (nodes, rows, words...).
+    """
+
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+# state_pattern
+
+
+def book_xml(scale):
+    chapters = "".join(
+        f"<chapter><number>{i}</number><title>Chapter {i}</title></chapter>" for i in range(int(200 * scale))
+    )
+    xml = f"<book><author>Dusty Phillips</author><content>{chapters}</content></book>"
+
+    # Parser recurses once per state change, which is several times per tag
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), xml.count("<") * 4 + 1000))
+    return xml
+
+
+@scenario
+def state_parse_xml(scale):
+    import state_pattern
+
+    xml = book_xml(scale)
+
+    def run():
+        parser = state_pattern.Parser(xml)
+        parser.start()
+
+    return run, xml.count("<") // 2
+
+
+@scenario
+def state_load_cached(scale):
+    import state_pattern
+
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    path = os.path.join(directory, "book.xml")
+    xml = book_xml(scale)
+    with open(path, "w") as file:
+        file.write(xml)
+
+    # The first call parses and writes the cache, every run after that loads it
+    state_pattern.parse_file(path)
+
+    def run():
+        state_pattern.parse_file(path)
+
+    return run, xml.count("<") // 2
+
+
+# composite_pattern
+
+
+@scenario
+def composite_get_path(scale):
+    import composite_pattern
+
+    depth = int(200 * scale)
+    composite_pattern.root = folder = composite_pattern.Folder('')
+    names = []
+    for i in range(depth):
+        child = composite_pattern.Folder(f"folder{i}")
+        folder.add_child(child)
+        folder = child
+        names.append(child.name)
+    path = "/" + "/".join(names)
+
+    def run():
+        for _ in range(100):
+            composite_pattern.get_path(path)
+
+    return run, 100
+
+
+@scenario
+def composite_move(scale):
+    import composite_pattern
+
+    depth = int(200 * scale)
+    composite_pattern.root = composite_pattern.Folder('')
+    paths = []
+    for branch in ("left", "right"):
+        folder = composite_pattern.Folder(branch)
+        composite_pattern.root.add_child(folder)
+        names = [branch]
+        for i in range(depth):
+            child = composite_pattern.Folder(f"folder{i}")
+            folder.add_child(child)
+            folder = child
+            names.append(child.name)
+        paths.append("/" + "/".join(names))
+
+    file = composite_pattern.File("file", "contents")
+    folder.add_child(file)
+
+    def run():
+        for _ in range(50):
+            file.move(paths[0])
+            file.move(paths[1])
+
+    return run, 100
+
+
+# abstract_factory_pattern
+
+
+@scenario
+def currency_format(scale):
+    import abstract_factory_pattern
+
+    rng = random.Random(0)
+    amounts = [(rng.randrange(10 ** 9), rng.randrange(100)) for _ in range(int(10000 * scale))]
+    formatters = [
+        abstract_factory_pattern.get_formatter_factory(country).create_currency_formatter()
+        for country in ("US", "FR")
+    ]
+
+    def run():
+        for formatter in formatters:
+            for base, cents in amounts:
+                formatter.format_currency(base, cents)
+
+    return run, len(amounts) * len(formatters)
+
+
+# observer_pattern
+
+
+@scenario
+def observer_notify(scale):
+    import observer_pattern
+
+    inventory = observer_pattern.Inventory()
+    seen = []
+    for _ in range(100):
+        inventory.attach(lambda: seen.append(inventory.quantity))
+    updates = int(1000 * scale)
+
+    def run():
+        for quantity in range(updates):
+            inventory.quantity = quantity
+        seen.clear()
+
+    return run, updates * 100
+
+
+@scenario
+def observer_contention(scale):
+    import observer_pattern
+
+    writers = readers = 8
+    updates = int(2000 * scale)
+    reads = int(20000 * scale)
+
+    def write(inventory):
+        for quantity in range(updates):
+            inventory.update(product=f"item {quantity}", quantity=quantity)
+
+    def read(inventory, torn):
+        for _ in range(reads):
+            snapshot = inventory.snapshot
+            if snapshot.version and snapshot.product != f"item {snapshot.quantity}":
+                torn.append(snapshot)
+
+    def run():
+        inventory = observer_pattern.ConcurrentInventory()
+        seen = []
+        inventory.attach(lambda: seen.append(inventory.snapshot.version))
+        torn = []
+
+        threads = [threading.Thread(target=write, args=(inventory,)) for _ in range(writers)]
+        threads += [threading.Thread(target=read, args=(inventory, torn)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every update notified exactly once, in order, and no reader saw half an update
+        assert seen == list(range(1, writers * updates + 1)), "notifications were lost or reordered"
+        assert not torn, f"{len(torn)} torn reads"
+
+    return run, writers * updates + readers * reads
+
+
+# flyweight_pattern
+
+
+@scenario
+def flyweight_churn(scale):
+    import flyweight_pattern
+
+    names = [f"MODEL {i}" for i in range(100)]
+    cars = int(10000 * scale)
+
+    def run():
+        # Keep a few models alive, the others get collected and created again
+        kept = [flyweight_pattern.CarModel(name, air=True) for name in names[:10]]
+        for i in range(cars):
+            flyweight_pattern.Car(flyweight_pattern.CarModel(names[i % len(names)]), "blue", i)
+        del kept
+
+    return run, cars
+
+
+# template_pattern
+
+
+@scenario
+def template_reports(scale):
+    import template_pattern
+
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    database = os.path.join(directory, "sales.db")
+    rng = random.Random(0)
+    people = [f"Salesperson {i}" for i in range(50)]
+    models = [f"Model {i}" for i in range(200)]
+    rows = ((rng.choice(people), rng.randrange(5000, 60000), rng.randrange(2000, 2021), rng.choice(models),
+             rng.choice(("true", "false"))) for _ in range(int(100000 * scale)))
+    template_pattern.SalesLoader(database).load(rows, source="benchmark")
+
+    pool = template_pattern.ConnectionPool(database)
+
+    class NewVehicles(template_pattern.StreamingQueryTemplate, template_pattern.NewVehiclesQuery):
+        def output_results(self):
+            for _ in self.formatted_results:
+                pass
+
+    class UserGross(template_pattern.UserGrossQuery):
+        def output_results(self):
+            pass
+
+    reports = [NewVehicles(), UserGross()]
+    for report in reports:
+        report.pool = pool
+
+    def run():
+        for report in reports:
+            report.process_format()
+
+    return run, int(100000 * scale)
+
+
+# iterator_pattern
+
+
+def corpus(scale):
+    rng = random.Random(0)
+    words = ["yo", "momma", "so", "fat", "hi", "lmao", "what", "the", "heck", "is", "this"]
+    return " ".join(rng.choice(words) for _ in range(int(200000 * scale)))
+
+
+@scenario
+def iterator_eager(scale):
+    import iterator_pattern
+
+    text = corpus(scale)
+    iterable = iterator_pattern.Iterable(text)
+
+    def run():
+        iterator = iter(iterable)
+        while True:
+            try:
+                next(iterator)
+            except StopIteration:
+                break
+
+    return run, int(200000 * scale)
+
+
+@scenario
+def iterator_lazy(scale):
+    import iterator_pattern
+
+    text = corpus(scale)
+
+    def run():
+        for _ in iterator_pattern.LazyIterableAndIterator(text):
+            pass
+
+    return run, int(200000 * scale)
+
+
+@scenario
+def iterator_indexed(scale):
+    import iterator_pattern
+
+    iterable = iterator_pattern.IndexedIterable(corpus(scale))
+
+    def run():
+        for _ in iterable:
+            pass
+
+    return run, len(iterable)
+
+
+def measure(name, scale, iterations):
+    run, items = SCENARIOS[name](scale)
+    run()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        run()
+        latencies.append(time.perf_counter_ns() - start)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies_ms = [latency / 1e6 for latency in latencies]
+    percentiles = statistics.quantiles(latencies_ms, n=100, method="inclusive") if iterations > 1 else latencies_ms * 99
+    return {
+        "items": items,
+        "iterations": iterations,
+        "items_per_second": items / (statistics.mean(latencies) / 1e9),
+        "latency_ms": {
+            "p50": percentiles[49],
+            "p90": percentiles[89],
+            "p99": percentiles[98],
+            "max": max(latencies_ms),
+        },
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="scenarios to run, all by default")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the size of every scenario's input")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["scenarios"]
+
+    results = {}
+    print(f"{'scenario':<20} {'items/s':>14} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'peak KiB':>10}")
+    for name in args.only or SCENARIOS:
+        result = results[name] = measure(name, args.scale, args.iterations)
+        latency = result["latency_ms"]
+        line = (f"{name:<20} {result['items_per_second']:>14,.0f} {latency['p50']:>10.3f} "
+                f"{latency['p90']:>10.3f} {latency['p99']:>10.3f} {result['peak_memory_kb']:>10.1f}")
+
+        if name in baseline:
+            speedup = baseline[name]["latency_ms"]["p50"] / latency["p50"]
+            line += f"  {speedup:.2f}x vs baseline"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created": datetime.datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "scale": args.scale,
+                "scenarios": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
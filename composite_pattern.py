@@ -70,30 +70,31 @@ def get_path(path):
     return node
 
 
-# Create some folders
-folder1 = Folder('folder1')
-folder2 = Folder('folder2')
-
-# Add them to the root directory
-root.add_child(folder1)
-root.add_child(folder2)
-
-# Create a child for folder1
-folder11 = Folder('folder11')
-folder1.add_child(folder11)
-
-# Create a child for folder11
-file111 = File('file111', 'contents')
-folder11.add_child(file111)
-
-# Create a child for folder2
-file21 = File('file21', 'other contents')
-folder2.add_child(file21)
-
-# Move folder2 to folder11
-folder2.move('/folder1/folder11')
-print(folder11.children)
-
-# Move folder21 to folder1
-file21.move('/folder1')
-print(folder1.children)
+if __name__ == "__main__":
+    # Create some folders
+    folder1 = Folder('folder1')
+    folder2 = Folder('folder2')
+
+    # Add them to the root directory
+    root.add_child(folder1)
+    root.add_child(folder2)
+
+    # Create a child for folder1
+    folder11 = Folder('folder11')
+    folder1.add_child(folder11)
+
+    # Create a child for folder11
+    file111 = File('file111', 'contents')
+    folder11.add_child(file111)
+
+    # Create a child for folder2
+    file21 = File('file21', 'other contents')
+    folder2.add_child(file21)
+
+    # Move folder2 to folder11
+    folder2.move('/folder1/folder11')
+    print(folder11.children)
+
+    # Move folder21 to folder1
+    file21.move('/folder1')
+    print(folder1.children)
@@ -10,9 +10,6 @@ For eg: The requests library is a facade over the less readable HTTP library.
 
 """
 
-import smtplib
-import imaplib
-
 
 class EmailFacade:
     def __init__(self, host, username, password):
@@ -30,11 +27,16 @@ class EmailFacade:
                    f"To: {to_email}\r\n"
                    f"Subject: {subject}\r\n\r\n{message}")
 
+        # The mail libraries are slow to import, so wait until they're needed
+        import smtplib
+
         smtp = smtplib.SMTP(self.host)
         smtp.login(self.username, self.password)
         smtp.sendmail(from_email, [to_email], message)
 
     def get_inbox(self):
+        import imaplib
+
         mailbox = imaplib.IMAP4(self.host)
         mailbox.login(bytes(self.username, 'utf8'), bytes(self.password, 'utf8'))
         mailbox.select()
@@ -32,8 +32,31 @@ THE
 HECK
 IS
 THIS
+
+The Lazy versions of both work the same way, but they don't split the whole input up front.
+They read it chunk by chunk from a string, a file object or an mmap, so even a huge file
+is iterated in constant memory:
+
+>>> with open("corpus.txt") as file:
+...     for thing in LazyIterable(file):
+...         print(thing)
+
+IndexedIterable finds the words once, up front, and then can be looped over as often as you like,
+indexed, sliced and split into balanced parts for a process pool:
+
+>>> x = IndexedIterable("HI LMAO WHAT THE HECK IS THIS")
+>>> len(x), x[1], list(x[2:4])
+(7, 'LMAO', ['WHAT', 'THE'])
+>>> with concurrent.futures.ProcessPoolExecutor() as executor:
+...     counts = list(executor.map(len, x.split(4)))
+>>> counts
+[1, 2, 2, 2]
 """
 
+import re
+from array import array
+
+
 class Iterable:
     """This is what you want to iterate over"""
 
@@ -81,3 +104,182 @@ class IterableAndIterator:
     def __iter__(self):
         """I AM THE ITERATOR LMAO"""
         return self
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def read_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield pieces of a string, or of anything with a read method (files, mmaps)"""
+
+    if isinstance(source, (str, bytes)):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+        return
+
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def upper_word(word):
+    # Binary files and mmaps give us bytes
+    if isinstance(word, bytes):
+        word = word.decode()
+    return word.upper()
+
+
+def lazy_words(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the upper cased words of source, reading chunk_size characters at a time"""
+
+    tail = None
+    for chunk in read_chunks(source, chunk_size):
+        if tail:
+            chunk = tail + chunk
+
+        words = chunk.split()
+
+        # A chunk that doesn't end in whitespace may have cut its last word in
+        # half, so hold it back and glue it to the front of the next chunk
+        if words and not chunk[-1:].isspace():
+            tail = words.pop()
+        else:
+            tail = None
+
+        for word in words:
+            yield upper_word(word)
+
+    if tail:
+        yield upper_word(tail)
+
+
+class LazyIterable:
+    """
+    Like Iterable, but source can also be a file object or an mmap.
+
+    Sources that can't seek, like pipes, can only be looped over once.
+    """
+
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.start = None
+
+        # mmaps don't have seekable(), but they can always seek
+        if hasattr(source, "tell") and getattr(source, "seekable", lambda: True)():
+            try:
+                self.start = source.tell()
+            except OSError:
+                pass
+
+    def __iter__(self):
+        # Rewind files so every loop starts from the same place
+        if self.start is not None:
+            self.source.seek(self.start)
+
+        return LazyIterator(self.source, self.chunk_size)
+
+
+class LazyIterator:
+    """Like Iterator, but words are only read and upper cased when asked for"""
+
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.words = lazy_words(source, chunk_size)
+
+    def __next__(self):
+        return next(self.words)
+
+
+class LazyIterableAndIterator:
+    """IterableAndIterator, but lazy lol"""
+
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.source = source
+        self.words = lazy_words(source, chunk_size)
+
+    def __next__(self):
+        return next(self.words)
+
+    def __iter__(self):
+        return self
+
+
+class IndexedIterable:
+    """
+    Words are located once, when it's created, and only their offsets are kept.
+    Every loop, index and slice after that reuses those offsets, slices are views
+    that share them, so len and slicing are O(1).
+    """
+
+    WORD = re.compile(r"\S+")
+
+    def __init__(self, string):
+        self.string = string
+        self.starts = array("q")
+        self.ends = array("q")
+        for match in self.WORD.finditer(string):
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+
+        self.indices = range(len(self.starts))
+        self.offset = 0
+
+    @classmethod
+    def view(cls, string, starts, ends, indices, offset=0):
+        """Make an IndexedIterable out of offsets that were already computed"""
+
+        iterable = cls.__new__(cls)
+        iterable.string = string
+        iterable.starts = starts
+        iterable.ends = ends
+        iterable.indices = indices
+        iterable.offset = offset
+        return iterable
+
+    def word(self, index):
+        start = self.starts[index] - self.offset
+        end = self.ends[index] - self.offset
+        return self.string[start:end].upper()
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.view(self.string, self.starts, self.ends, self.indices[item], self.offset)
+
+        return self.word(self.indices[item])
+
+    def __iter__(self):
+        """A fresh generator every time, so looping again starts over"""
+
+        for index in self.indices:
+            yield self.word(index)
+
+    def split(self, parts):
+        """Split into the given number of parts, whose lengths differ by at most one"""
+
+        size = len(self)
+        return [self[size * part // parts:size * (part + 1) // parts] for part in range(parts)]
+
+    def __reduce__(self):
+        # Only send the piece of the string this view covers when pickling,
+        # instead of the whole corpus, so handing parts to processes stays cheap
+        indices = self.indices
+        if not indices:
+            return IndexedIterable, ("",)
+
+        if indices.step != 1:
+            return IndexedIterable, (" ".join(self.string[self.starts[i] - self.offset:self.ends[i] - self.offset]
+                                              for i in indices),)
+
+        first, last = indices[0], indices[-1]
+        begin = self.starts[first] - self.offset
+        end = self.ends[last] - self.offset
+        return self.view, (self.string[begin:end],
+                           self.starts[first:last + 1],
+                           self.ends[first:last + 1],
+                           range(last - first + 1),
+                           self.starts[first])
@@ -25,8 +25,18 @@ The observer pattern detaches the code being observed from the code doing the ob
 
 Achieving this same functionality without this pattern would mean lots of conditions when setting
 any property, both maintenance and addition of features would become really painful eventually.
+
+When several threads share an inventory, use ConcurrentInventory. update() changes several
+fields at once, and observers (and readers) see them change together:
+>>> i = ConcurrentInventory()
+>>> i.attach(ConsoleSnapshotObserver(i))
+>>> i.update(product="Gadget", quantity=5)
+InventorySnapshot(product='Gadget', quantity=5, version=1)
 """
 
+import collections
+import threading
+
 
 class Inventory:
     def __init__(self):
@@ -67,3 +77,64 @@ class ConsoleObserver:
     def __call__(self):
         print(self.inventory.product)
         print(self.inventory.quantity)
+
+
+InventorySnapshot = collections.namedtuple("InventorySnapshot", ["product", "quantity", "version"])
+
+
+class ConcurrentInventory(Inventory):
+    """
+    An Inventory that's safe to share between threads.
+
+    All of its state lives in one immutable snapshot. Writers build a new snapshot
+    and swap it in with a single assignment, so readers don't need a lock: reading
+    inventory.snapshot once always gives a product and quantity that belong together.
+
+    Writers take turns through a lock, and observers are notified while it's held,
+    once per update and in order, so inventory.snapshot inside an observer is always
+    the update it's being told about.
+    """
+
+    def __init__(self):
+        self.observers = []
+        # Reentrant, so an observer can update the inventory it's observing
+        self._lock = threading.RLock()
+        self.snapshot = InventorySnapshot(None, 0, 0)
+
+    def attach(self, observer):
+        # Replace the list instead of appending, so a notification
+        # already looping over the old list isn't disturbed
+        with self._lock:
+            self.observers = self.observers + [observer]
+
+    @property
+    def product(self):
+        return self.snapshot.product
+
+    @product.setter
+    def product(self, value):
+        self.update(product=value)
+
+    @property
+    def quantity(self):
+        return self.snapshot.quantity
+
+    @quantity.setter
+    def quantity(self, value):
+        self.update(quantity=value)
+
+    def update(self, **changes):
+        """Change any of product and quantity at once, observers are notified once"""
+
+        with self._lock:
+            snapshot = self.snapshot
+            self.snapshot = snapshot._replace(version=snapshot.version + 1, **changes)
+            self._update_observers()
+
+
+class ConsoleSnapshotObserver:
+    def __init__(self, inventory):
+        self.inventory = inventory
+
+    def __call__(self):
+        print(self.inventory.snapshot)
@@ -15,8 +15,22 @@ So for this we have:
 
 We'll build a simple XML parser to illustrate this pattern.
 
+Parsing goes through the state machine one character range at a time, which is slow on big files.
+parse_file() saves the parsed tree in a compact binary file next to the source, and loads that
+instead of parsing again until the source changes:
+
+>>> root = parse_file("state_pattern_xml.txt")   # parses, writes state_pattern_xml.txt.nodes
+>>> root = parse_file("state_pattern_xml.txt")   # loads state_pattern_xml.txt.nodes
+
 """
 
+import hashlib
+import io
+import os
+import struct
+import sys
+from array import array
+
 xml_to_parse = \
     """
 <book>
@@ -127,16 +141,153 @@ class TextNode:
         return remaining_string[i_start_tag:]
 
 
+# Binary tree files
+#
+# header: magic, format version, source mtime (ns), source size, source sha256,
+#         number of nodes, byte lengths of the tag table and of the text blob
+# tag table: every distinct tag name once, utf-8, separated by NUL bytes
+# text blob: the text of every node concatenated, utf-8
+# nodes: four little endian uint32 per node in preorder:
+#        tag index, text offset and text length (in characters), number of children
+
+TREE_MAGIC = b"XMLT"
+TREE_VERSION = 1
+TREE_HEADER = struct.Struct("<4sBqq32sIII")
+
+
+def dump_tree(root, file, mtime_ns=0, size=0, digest=bytes(32)):
+    tags = {}
+    texts = []
+    text_length = 0
+    records = array("I")
+
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        records.extend((tags.setdefault(node.tag_name, len(tags)), text_length, len(node.text), len(node.children)))
+        texts.append(node.text)
+        text_length += len(node.text)
+        nodes.extend(reversed(node.children))
+
+    if sys.byteorder == "big":
+        records.byteswap()
+
+    tag_table = "\0".join(tags).encode()
+    text_blob = "".join(texts).encode()
+    file.write(TREE_HEADER.pack(TREE_MAGIC, TREE_VERSION, mtime_ns, size, digest,
+                                len(records) // 4, len(tag_table), len(text_blob)))
+    file.write(tag_table)
+    file.write(text_blob)
+    file.write(records.tobytes())
+
+
+def read_tree_header(file):
+    """Returns (mtime_ns, size, digest, node count, tag table length, text blob length), or None"""
+
+    header = file.read(TREE_HEADER.size)
+    if len(header) != TREE_HEADER.size:
+        return None
+
+    magic, version, *fields = TREE_HEADER.unpack(header)
+    if magic != TREE_MAGIC or version != TREE_VERSION:
+        return None
+    return fields
+
+
+def load_tree(file, header=None):
+    """Rebuild the tree written by dump_tree, without going through Parser at all"""
+
+    _, _, _, count, tag_table_length, text_length = header or read_tree_header(file)
+    tags = file.read(tag_table_length).decode().split("\0")
+    text = file.read(text_length).decode()
+    records = array("I")
+    records.frombytes(file.read(count * 4 * records.itemsize))
+    if sys.byteorder == "big":
+        records.byteswap()
+
+    root = None
+    # [node, children still to come] for every node whose children we're reading
+    open_nodes = []
+    for i in range(0, len(records), 4):
+        tag, start, length, children = records[i:i + 4]
+        parent = open_nodes[-1][0] if open_nodes else None
+        node = Node(tags[tag], parent)
+        node.text = text[start:start + length]
+
+        if parent is None:
+            root = node
+        else:
+            parent.children.append(node)
+            open_nodes[-1][1] -= 1
+
+        if children:
+            open_nodes.append([node, children])
+        else:
+            while open_nodes and not open_nodes[-1][1]:
+                open_nodes.pop()
+
+    return root
+
+
+def parse_file(path, cache=True):
+    """
+    Parse an xml file, reusing the tree saved in path + ".nodes" when the source
+    hasn't changed: its mtime and size match, or failing that, its sha256 does.
+    """
+
+    stat = os.stat(path)
+    cache_path = path + ".nodes"
+    header = None
+
+    if cache:
+        try:
+            with open(cache_path, "rb") as file:
+                header = read_tree_header(file)
+                if header and header[:2] == [stat.st_mtime_ns, stat.st_size]:
+                    return load_tree(file, header)
+        except OSError:
+            pass
+
+    with open(path, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha256(data).digest()
+
+    if header and header[2] == digest:
+        with open(cache_path, "rb") as file:
+            file.seek(TREE_HEADER.size)
+            root = load_tree(file, header)
+
+        # Touched but not changed, remember the new mtime so the next load is the fast one.
+        # The cache is only a speedup, so if it can't be written just keep using it as it is
+        try:
+            with open(cache_path, "r+b") as file:
+                file.write(TREE_HEADER.pack(TREE_MAGIC, TREE_VERSION, stat.st_mtime_ns, stat.st_size, digest,
+                                            *header[3:]))
+        except OSError:
+            pass
+        return root
+
+    # newline=None translates line endings the same way open() in text mode does
+    parser = Parser(io.StringIO(data.decode(), newline=None).read())
+    parser.start()
+
+    if cache:
+        try:
+            # Write to a temporary file first so a reader never sees half a tree
+            with open(cache_path + ".tmp", "wb") as file:
+                dump_tree(parser.root, file, stat.st_mtime_ns, stat.st_size, digest)
+            os.replace(cache_path + ".tmp", cache_path)
+        except OSError:
+            pass
+
+    return parser.root
+
+
 if __name__ == "__main__":
-    import sys
-    
-    with open(sys.argv[1]) as file:
-        contents = file.read()
-        p = Parser(contents)
-        p.start()
-        nodes = [p.root]
-
-        while nodes:
-            node = nodes.pop(0)
-            print(node)
-            nodes = node.children + nodes
\ No newline at end of file
+    root = parse_file(sys.argv[1])
+    nodes = [root]
+
+    while nodes:
+        node = nodes.pop(0)
+        print(node)
+        nodes = node.children + nodes
\ No newline at end of file
@@ -21,8 +21,42 @@ I am slithering side to side because I am a snake.
 >>> human.walk()
 I am standing up on my two legs to walk because I am a 2 legged animal.
 
+A strategy can be a class, an instance or a plain function, and can be swapped at any time:
+
+>>> cobra.walk_strategy = lambda: print("I am a very confused snake.")
+>>> cobra.walk()
+I am a very confused snake.
+
+When there are lots of animals sharing a few strategies, put them in a Population.
+It walks each group of animals with the same strategy in one call, if the strategy has a walk_batch method.
+Other strategies, like the cobra's function, fall back to one walk() call per animal:
+
+>>> herd = Population([elephant, human, Animal(name="Rhino", walk=FourLegWalk), cobra])
+>>> herd.walk()
+I am a very confused snake.
+>>> herd.walk()
+I am a very confused snake.
+>>> herd.groups[FourLegWalk].positions
+array('d', [3.0, 3.0])
+>>> herd.groups[cobra.walk_strategy].positions
+array('d', [2.0])
+
+If you'd rather not pick a strategy by hand, an AdaptiveStrategy times the ones you give it
+on real calls and sends each call to whichever has been fastest for inputs of that size:
+
+>>> sort = AdaptiveStrategy(sorted, insertion_sort)
+>>> for i in range(1000):
+...     _ = sort(random.sample(range(1000), i % 50))
+>>> sorted(sort.timings()[63])
+['insertion_sort', 'sorted']
+
+Run this file to compare the cost of a walk() call against instantiating the strategy on every call.
 """
 
+import random
+import time
+from array import array
+
 
 class Animal:
     
@@ -30,6 +64,36 @@ class Animal:
         self.name = name
         self.walk_strategy = walk
 
+    @property
+    def walk_strategy(self):
+        return self._walk_strategy
+
+    @walk_strategy.setter
+    def walk_strategy(self, strategy):
+        """
+        Work out what to call once, when the strategy is assigned,
+        so walk() doesn't create a strategy object on every call.
+        """
+
+        self._walk_strategy = strategy
+        # Strategy classes get their one instance here, everything else is used as it is
+        self._walker = strategy() if isinstance(strategy, type) else strategy
+
+        if strategy is None:
+            self._walk = self._missing_walk
+        else:
+            self._walk = resolve_strategy(self._walker, 'walk')
+
+    @property
+    def walker(self):
+        """The strategy object walk() uses, the instance made from walk_strategy if it is a class"""
+
+        return self._walker
+
+    def _missing_walk(self):
+        message = '{} should implement a walk method'.format(self.__class__.__name__)
+        raise NotImplementedError(message)
+
     def walk(self):
         """
         Cause animal instance to walk
@@ -38,27 +102,241 @@ class Animal:
         be implemented separately by different types of animals.
         """
         
-        if self.walk_strategy is None:
-            message = '{} should implement a walk method'.format(self.__class__.__name__)
-            raise NotImplementedError(message)
-        
+        return self._walk()
+
+
+def resolve_strategy(strategy, method):
+    """Turn a strategy class, strategy instance or plain function into something to call"""
+
+    if isinstance(strategy, type):
+        return getattr(strategy(), method)
+    elif hasattr(strategy, method):
+        return getattr(strategy, method)
+    else:
+        return strategy
+
+
+def strategy_name(strategy):
+    if isinstance(strategy, type) or hasattr(strategy, '__name__'):
+        return strategy.__name__
+    return strategy.__class__.__name__
+
+
+def first_arg_size(*args, **kwargs):
+    if args and hasattr(args[0], '__len__'):
+        return len(args[0])
+    return 0
+
+
+class AdaptiveStrategy:
+    """
+    Chooses between interchangeable strategies by timing them on the calls it is given.
+
+    Calls are bucketed by input size, rounded up to a power of two. In each bucket
+    every strategy gets tried `trials` times, and from then on calls go to the
+    strategy with the lowest average time, except one call in every `explore`
+    which goes to a random strategy, so a bucket notices if the winner changes.
+
+    Strategies are classes, instances or functions, like Animal accepts. When they
+    are objects, `method` is the method that gets called. `size` works out the
+    input size from the call's arguments, it defaults to the length of the first one.
+    """
+
+    def __init__(self, *strategies, method='walk', size=first_arg_size, trials=3, explore=20):
+        self.strategies = [(strategy_name(strategy), resolve_strategy(strategy, method))
+                           for strategy in strategies]
+        self.size = size
+        self.trials = trials
+        self.explore = explore
+        self.calls = 0
+        # bucket -> {name: [calls, total nanoseconds]}
+        self.stats = {}
+        # bucket -> (name, function) of the fastest strategy, once every strategy has had its trials
+        self.winners = {}
+
+    def choose(self, bucket):
+        winner = self.winners.get(bucket)
+        if winner is not None and self.calls % self.explore:
+            return winner
+
+        stats = self.stats.get(bucket, {})
+        for name, function in self.strategies:
+            if stats.get(name, (0, 0))[0] < self.trials:
+                return name, function
+
+        return random.choice(self.strategies)
+
+    def record(self, bucket, name, elapsed):
+        stats = self.stats.setdefault(bucket, {})
+        entry = stats.setdefault(name, [0, 0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+        if all(stats.get(name, (0, 0))[0] >= self.trials for name, _ in self.strategies):
+            fastest = min(self.strategies, key=lambda strategy: stats[strategy[0]][1] / stats[strategy[0]][0])
+            self.winners[bucket] = fastest
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        bucket = self.size(*args, **kwargs).bit_length()
+        name, function = self.choose(bucket)
+
+        start = time.perf_counter_ns()
+        result = function(*args, **kwargs)
+        self.record(bucket, name, time.perf_counter_ns() - start)
+        return result
+
+    def timings(self):
+        """{largest input size in the bucket: {strategy name: (calls, average nanoseconds)}}"""
+
+        return {
+            (1 << bucket) - 1 if bucket else 0: {
+                name: (calls, round(total / calls, 1)) for name, (calls, total) in stats.items()
+            }
+            for bucket, stats in sorted(self.stats.items())
+        }
+
+
+def group_key(walker):
+    """
+    Instances of a strategy class walk alike, so a Population groups them by class,
+    however many instances there are. Plain functions are a group of their own.
+    """
+
+    if hasattr(walker, 'walk') or hasattr(walker, 'walk_batch'):
+        return type(walker)
+    return walker
+
+
+class Group:
+    """The animals of a Population that share one strategy, with their positions in an array"""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.animals = []
+        self.positions = array('d')
+
+    def add(self, animal):
+        self.animals.append(animal)
+        self.positions.append(0.0)
+
+    def walk(self):
+        walk_batch = getattr(self.strategy, 'walk_batch', None)
+        if walk_batch is not None:
+            walk_batch(self.positions)
         else:
-            self.walk_strategy().walk()
+            # Move the same way a batch would, by the strategy's pace
+            pace = getattr(self.strategy, 'pace', BatchWalk.pace)
+            for i, animal in enumerate(self.animals):
+                animal.walk()
+                self.positions[i] += pace
+
+
+class Population:
+    """
+    Lots of animals, grouped by the strategy they were given, see group_key.
+
+    Walking the population makes one walk_batch(positions) call per group instead of
+    one walk() call per animal. Strategies without a walk_batch method still work:
+    each of their animals' walk() is called and its position moves by the strategy's
+    pace (or BatchWalk's, if the strategy has none), just like a batch would move it.
+
+    Animals are grouped when they are added. Reassigning an animal's walk_strategy
+    afterwards doesn't move it to another group, so batches keep walking it the old way.
+    """
+
+    def __init__(self, animals=()):
+        self.groups = {}
+        for animal in animals:
+            self.add(animal)
+
+    def add(self, animal):
+        key = group_key(animal.walker)
+        group = self.groups.get(key)
+        if group is None:
+            # The first animal's strategy walks the whole group
+            group = self.groups[key] = Group(animal.walker)
+        group.add(animal)
+
+    def __len__(self):
+        return sum(len(group.animals) for group in self.groups.values())
+
+    def walk(self):
+        for group in self.groups.values():
+            group.walk()
 
 
 # Here are some different walking algorithms that can be used with Animal
 
 
-class SnakeWalk:
+class BatchWalk:
+    """Gives a walking strategy the batch interface used by Population"""
+
+    pace = 1.0
+
+    def walk_batch(self, positions):
+        # map runs the additions in C, there's no python level loop per animal
+        positions[:] = array('d', map(self.pace.__add__, positions))
+
+
+class SnakeWalk(BatchWalk):
+    pace = 0.5
+
     def walk(self):
         print('I am slithering side to side because I am a snake.')
 
 
-class FourLegWalk:
+class FourLegWalk(BatchWalk):
+    pace = 1.5
+
     def walk(self):
         print('I am using all four of my legs to walk because I am a 4 legged animal.')
 
 
-class TwoLegWalk:
+class TwoLegWalk(BatchWalk):
+    pace = 1.0
+
     def walk(self):
         print('I am standing up on my two legs to walk because I am a 2 legged animal.')
+
+
+# A pure python sorting algorithm to race against sorted with AdaptiveStrategy
+
+
+def insertion_sort(items):
+    items = list(items)
+    for i in range(1, len(items)):
+        item = items[i]
+        j = i - 1
+        while j >= 0 and items[j] > item:
+            items[j + 1] = items[j]
+            j -= 1
+        items[j + 1] = item
+    return items
+
+
+if __name__ == "__main__":
+    import timeit
+
+    class QuietWalk:
+        def walk(self):
+            pass
+
+    def legacy_walk(animal):
+        """How Animal.walk used to dispatch: a None check and a new strategy object per call"""
+
+        if animal.walk_strategy is None:
+            raise NotImplementedError()
+        else:
+            animal.walk_strategy().walk()
+
+    calls = 1_000_000
+    animal = Animal(name="Benchmark", walk=QuietWalk)
+    namespace = {"animal": animal, "legacy_walk": legacy_walk}
+
+    legacy = min(timeit.repeat("legacy_walk(animal)", globals=namespace, number=calls, repeat=5))
+    current = min(timeit.repeat("animal.walk()", globals=namespace, number=calls, repeat=5))
+
+    print(f"per call instantiation: {legacy / calls * 1e9:.1f}ns per walk")
+    print(f"resolved at assignment: {current / calls * 1e9:.1f}ns per walk")
+    print(f"{legacy / current:.2f}x faster")
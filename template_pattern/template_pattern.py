@@ -11,35 +11,421 @@ in subclasses to provide custom behavior.
 We're going to create a car sales reporter as an example.
 """
 
-import sqlite3
+import collections
 import datetime
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+
+# Database setup, create the tables and load the seed rows with seed_database().
+
+SALES_COLUMNS = ("salesperson", "amt", "year", "model", "new")
+
+SEED_ROWS = [
+    ('Tim', 16000, 2010, 'Honda Fit', 'true'),
+    ('Tim', 9000, 2006, 'Ford Focus', 'false'),
+    ('Gayle', 8000, 2004, 'Dodge Neon', 'false'),
+    ('Gayle', 28000, 2009, 'Ford Mustang', 'true'),
+    ('Gayle', 50000, 2010, 'Lincoln Navigator', 'true'),
+    ('Don', 20000, 2008, 'Toyota Prius', 'false'),
+]
+
+
+AGGREGATE_TRIGGERS = {
+    # Add a sale to the running totals
+    "insert": """
+        INSERT INTO SalesBySalesperson VALUES(new.salesperson, new.amt, 1)
+            ON CONFLICT(salesperson) DO UPDATE SET gross = gross + excluded.gross, sales = sales + 1;
+        INSERT INTO SalesByYearModel VALUES(new.year, new.model, new.amt, 1)
+            ON CONFLICT(year, model) DO UPDATE SET gross = gross + excluded.gross, sales = sales + 1;
+    """,
+    # Take a sale out of the running totals, dropping totals that have no sales left
+    "delete": """
+        UPDATE SalesBySalesperson SET gross = gross - old.amt, sales = sales - 1
+            WHERE salesperson = old.salesperson;
+        UPDATE SalesByYearModel SET gross = gross - old.amt, sales = sales - 1
+            WHERE year = old.year AND model = old.model;
+        DELETE FROM SalesBySalesperson WHERE sales = 0;
+        DELETE FROM SalesByYearModel WHERE sales = 0;
+    """,
+}
+AGGREGATE_TRIGGERS["update"] = AGGREGATE_TRIGGERS["delete"] + AGGREGATE_TRIGGERS["insert"]
+
+# The same totals for every sale after a given rowid, all at once, used by SalesLoader
+AGGREGATE_SINCE = [
+    "INSERT INTO SalesBySalesperson "
+    "SELECT salesperson, sum(amt), count(*) FROM Sales WHERE rowid > ? GROUP BY salesperson "
+    "ON CONFLICT(salesperson) DO UPDATE SET gross = gross + excluded.gross, sales = sales + excluded.sales",
+    "INSERT INTO SalesByYearModel "
+    "SELECT year, model, sum(amt), count(*) FROM Sales WHERE rowid > ? GROUP BY year, model "
+    "ON CONFLICT(year, model) DO UPDATE SET gross = gross + excluded.gross, sales = sales + excluded.sales",
+]
+
+
+def create_schema(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS Sales(salesperson text, amt currency, year integer, model text, new boolean)")
+    # One row per load, this is what makes loading the same source twice a no-op
+    conn.execute("CREATE TABLE IF NOT EXISTS SalesLoads(source text primary key, rows integer, loaded_at timestamp)")
+    create_aggregates(conn)
+    create_version(conn)
+    with conn:
+        create_triggers(conn)
+
+
+def create_version(conn):
+    """
+    A counter bumped on every change to Sales, from any connection.
+    ResultCache compares it to tell whether a cached report is still current.
+    """
+
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS SalesVersion(version integer)")
+        if conn.execute("SELECT 1 FROM SalesVersion").fetchone() is None:
+            conn.execute("INSERT INTO SalesVersion VALUES(0)")
+
+
+def create_aggregates(conn):
+    """
+    Create the per salesperson and per year/model totals of the Sales table.
+
+    Reports read one row per salesperson from them instead of scanning every sale.
+    Their primary keys are the only indexes the updates and reports need.
+    """
+
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='SalesBySalesperson'").fetchone()
+    if exists:
+        return
+
+    with conn:
+        conn.execute("CREATE TABLE SalesBySalesperson(salesperson text primary key, gross currency, sales integer)")
+        conn.execute("CREATE TABLE SalesByYearModel(year integer, model text, gross currency, sales integer, "
+                     "primary key(year, model))")
+
+        # Catch up with the sales made before the totals existed
+        conn.execute("INSERT INTO SalesBySalesperson "
+                     "SELECT salesperson, sum(amt), count(*) FROM Sales GROUP BY salesperson")
+        conn.execute("INSERT INTO SalesByYearModel "
+                     "SELECT year, model, sum(amt), count(*) FROM Sales GROUP BY year, model")
+
+
+def create_triggers(conn):
+    """
+    Keep the totals and the version current for writes that don't go through SalesLoader.
+
+    Per row triggers cost more than the insert itself, so SalesLoader drops them
+    inside its transaction, updates the totals and the version once per load, and
+    creates them again before committing. Other connections never see them missing.
+    """
+
+    for event, body in AGGREGATE_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS sales_{event} AFTER {event.upper()} ON Sales "
+                     f"BEGIN {body} UPDATE SalesVersion SET version = version + 1; END")
+
+
+def drop_triggers(conn):
+    for event in AGGREGATE_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS sales_{event}")
+
+
+LoadReport = collections.namedtuple("LoadReport", ["source", "rows", "seconds", "rows_per_second"])
+
+
+class SalesLoader:
+    """
+    Bulk loads rows into the Sales table.
+
+    Rows are inserted with executemany, batch_size rows at a time, inside a single
+    transaction per load. The sales totals and version are updated once per load
+    rather than by the per row triggers, see create_triggers. Every load is recorded
+    under a source name in that same transaction, so loading the same source again
+    does nothing and a failed load leaves nothing behind.
+
+    >>> import os, tempfile
+    >>> loader = SalesLoader(os.path.join(tempfile.mkdtemp(), "sales.db"))
+    >>> loader.load(SEED_ROWS, source="seed").rows
+    6
+    >>> loader.load(SEED_ROWS, source="seed").rows
+    0
+    """
+
+    def __init__(self, database="sales.db", batch_size=10000, journal_mode="WAL", synchronous="NORMAL"):
+        self.database = database
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+
+    def connect(self):
+        # isolation_level=None lets us manage the transactions ourselves
+        conn = sqlite3.connect(self.database, isolation_level=None)
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        create_schema(conn)
+        return conn
+
+    def load(self, rows, source):
+        """Insert an iterable of (salesperson, amt, year, model, new) tuples"""
+
+        start = time.perf_counter()
+        conn = self.connect()
+        try:
+            loaded = conn.execute("SELECT 1 FROM SalesLoads WHERE source=?", (source,)).fetchone()
+            total = 0
+
+            if not loaded:
+                conn.execute("BEGIN")
+                try:
+                    # Nobody else sees the triggers missing, they're back before we commit
+                    drop_triggers(conn)
+                    # New rows get rowids after the current largest one
+                    last_rowid = conn.execute("SELECT coalesce(max(rowid), 0) FROM Sales").fetchone()[0]
+
+                    rows = iter(rows)
+                    while True:
+                        batch = list(itertools.islice(rows, self.batch_size))
+                        if not batch:
+                            break
+                        conn.executemany("INSERT INTO Sales VALUES(?, ?, ?, ?, ?)", batch)
+                        total += len(batch)
+
+                    if total:
+                        for statement in AGGREGATE_SINCE:
+                            conn.execute(statement, (last_rowid,))
+                        conn.execute("UPDATE SalesVersion SET version = version + 1")
+
+                    create_triggers(conn)
+                    conn.execute("INSERT INTO SalesLoads VALUES(?, ?, ?)",
+                                 (source, total, datetime.datetime.now()))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        finally:
+            conn.close()
+
+        seconds = time.perf_counter() - start
+        return LoadReport(source, total, seconds, total / seconds if seconds else 0.0)
+
+    def load_csv(self, path, source=None):
+        """Load a CSV file with a salesperson,amt,year,model,new header row"""
+
+        import csv
+
+        with open(path, newline='') as csvfile:
+            reader = csv.DictReader(csvfile)
+            rows = (tuple(row[column] for column in SALES_COLUMNS) for row in reader)
+            return self.load(rows, source or path)
+
+
+def seed_database(database="sales.db"):
+    """Load the seed rows, unless the database already has sales in it"""
+
+    # The default rollback journal, so seeding doesn't leave -wal and -shm files next to the database
+    loader = SalesLoader(database, journal_mode="DELETE")
+    conn = loader.connect()
+    try:
+        has_sales = conn.execute("SELECT 1 FROM Sales LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+    if has_sales:
+        return LoadReport("seed", 0, 0.0, 0.0)
+    return loader.load(SEED_ROWS, source="seed")
+
+
+class ConnectionPool:
+    """
+    Hands out sqlite3 connections and takes them back, so a report doesn't pay
+    for opening (and forgetting to close) a connection every time it runs.
+
+    Each connection keeps its own statement cache, so parameterized queries that
+    are run again on a pooled connection skip sqlite's parsing and planning step.
+    Connections may be acquired and released from any thread, but only one
+    thread holds a given connection at a time.
+
+    With read_only=True the database is opened in sqlite's read only mode, which
+    is what reports running side by side should use.
+    """
+
+    def __init__(self, database="sales.db", size=5, cached_statements=128, read_only=False):
+        self.database = database
+        self.size = size
+        self.cached_statements = cached_statements
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._in_use = set()
+        self._closing = False
+        self._schema_ready = False
+        self.opened = 0
+        self.closed = 0
+
+    def _open(self):
+        self.opened += 1
+        if not self._schema_ready:
+            self._create_schema()
+
+        if self.read_only:
+            import pathlib
+
+            database, uri = pathlib.Path(self.database).absolute().as_uri() + "?mode=ro", True
+        else:
+            database, uri = self.database, False
+
+        return sqlite3.connect(database,
+                               uri=uri,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False)
+
+    def _create_schema(self):
+        """
+        Databases made before the totals and version tables existed get them on
+        first use. Read only connections can't create them, so this uses a short
+        lived writable one, and leaves a read only pool's database alone if even
+        that can't write to it.
+        """
+
+        if self.read_only:
+            import pathlib
+
+            # mode=rw so a missing database is an error, not a new empty file
+            database, uri = pathlib.Path(self.database).absolute().as_uri() + "?mode=rw", True
+        else:
+            database, uri = self.database, False
+
+        try:
+            conn = sqlite3.connect(database, uri=uri)
+            try:
+                create_schema(conn)
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            if not self.read_only:
+                raise
+        self._schema_ready = True
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self.opened - self.closed < self.size
+                conn = self._open() if can_open else None
+            if conn is None:
+                # Every connection is checked out, wait for one to come back
+                conn = self._idle.get()
 
-# Database setup, create a table and insert values.
+        with self._lock:
+            self._in_use.add(conn)
+        return conn
 
-conn = sqlite3.connect("sales.db")
-try:
-    conn.execute("CREATE TABLE Sales(salesperson text, amt currency, year integer, model text, new boolean)")
-except sqlite3.OperationalError:
-    pass
-conn.execute("INSERT INTO Sales values('Tim', 16000, 2010, 'Honda Fit', 'true')")
-conn.execute("INSERT INTO Sales values('Tim', 9000, 2006, 'Ford Focus', 'false')")
-conn.execute("INSERT INTO Sales values('Gayle', 8000, 2004, 'Dodge Neon', 'false')")
-conn.execute("INSERT INTO Sales values('Gayle', 28000, 2009, 'Ford Mustang', 'true')")
-conn.execute("INSERT INTO Sales values('Gayle', 50000, 2010, 'Lincoln Navigator', 'true')")
-conn.execute("INSERT INTO Sales values('Don', 20000, 2008, 'Toyota Prius', 'false')")
-conn.commit()
-conn.close()
+    def release(self, conn):
+        with self._lock:
+            self._in_use.remove(conn)
+            if self._closing:
+                # The pool was closed while this was checked out, close it instead of keeping it
+                conn.close()
+                self.closed += 1
+                return
+        self._idle.put(conn)
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+    def close(self):
+        """
+        Close the idle connections, returns how many are still checked out.
+        Those get closed when they are released.
+        """
+
+        with self._lock:
+            self._closing = True
+
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            self.closed += 1
+
+        return self.in_use
+
+
+class ResultCache:
+    """
+    Remembers the results and formatted output of reports, keyed by database, query and params.
+
+    Every entry is tagged with the SalesVersion it was computed at, and is only
+    served while that version hasn't changed. So a report over unchanged data
+    costs one tiny version lookup instead of running its query again.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(report):
+        # Versions of different databases are unrelated, so the same query on
+        # two of them must never share an entry
+        return report.pool.database, report.query, tuple(report.params)
+
+    def load(self, report):
+        """Fill in the report's results from the cache, returns whether it could"""
+
+        # Read before the query runs, so a change made while it runs makes the entry stale, not wrong
+        report.data_version = report.conn.execute("SELECT version FROM SalesVersion").fetchone()[0]
+        key = self.key(report)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != report.data_version:
+                self.misses += 1
+                return False
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            _, report.results, report.formatted_results = entry
+            return True
+
+    def store(self, report):
+        key = self.key(report)
+
+        with self.lock:
+            self.entries[key] = (report.data_version, report.results, report.formatted_results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
 
 
 class QueryTemplate:
+    # Shared by every subclass, override it on a subclass or instance to use another database
+    pool = ConnectionPool("sales.db")
+    # Set to a ResultCache to skip the query and formatting while Sales hasn't changed
+    cache = None
+    params = ()
+    conn = None
+
     def connect(self):
-        self.conn = sqlite3.connect("sales.db")
+        self.conn = self.pool.acquire()
+
+    def disconnect(self):
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
 
     def construct_query(self):
         raise NotImplementedError()
 
     def do_query(self):
-        results = self.conn.execute(self.query)
+        results = self.conn.execute(self.query, self.params)
         self.results = results.fetchall()
 
     def format_results(self):
@@ -53,17 +439,41 @@ class QueryTemplate:
     def output_results(self):
         raise NotImplementedError()
 
+    def run_step(self, step):
+        """Run one step of the template, recording how long it took in self.timings"""
+
+        if not hasattr(self, "timings"):
+            self.timings = {}
+        start = time.perf_counter()
+        step()
+        self.timings[step.__name__] = time.perf_counter() - start
+
+    def prepare(self):
+        """Run every step up to, but not including, output_results"""
+
+        self.timings = {}
+        self.run_step(self.connect)
+        try:
+            self.run_step(self.construct_query)
+            if self.cache is not None and self.cache.load(self):
+                return
+
+            self.run_step(self.do_query)
+            self.run_step(self.format_results)
+            if self.cache is not None:
+                self.cache.store(self)
+        finally:
+            self.disconnect()
+
     def process_format(self):
-        self.connect()
-        self.construct_query()
-        self.do_query()
-        self.format_results()
-        self.output_results()
+        self.prepare()
+        self.run_step(self.output_results)
 
 
 class NewVehiclesQuery(QueryTemplate):
     def construct_query(self):
-        self.query = "select * from Sales where new='true'"
+        self.query = "select * from Sales where new=?"
+        self.params = ('true',)
 
     def output_results(self):
         print(self.formatted_results)
@@ -71,7 +481,7 @@ class NewVehiclesQuery(QueryTemplate):
 
 class UserGrossQuery(QueryTemplate):
     def construct_query(self):
-        self.query = ("select salesperson, sum(amt) from Sales group by salesperson")
+        self.query = ("select salesperson, gross from SalesBySalesperson order by salesperson")
 
     def output_results(self):
         filename = f"gross_sales_{datetime.date.today().strftime('%Y%m%d')}.txt"
@@ -79,13 +489,180 @@ class UserGrossQuery(QueryTemplate):
             outfile.write(self.formatted_results)
 
 
+class StreamingQueryTemplate(QueryTemplate):
+    """
+    Same steps as QueryTemplate, but they form a generator pipeline instead of
+    building the whole result in memory: rows are fetched in chunks, formatted
+    one at a time and handed to output_results as they come.
+
+    output_results should consume self.formatted_results exactly once, the
+    connection stays checked out until it is done. That also means the real
+    query work happens in output_results, so that's where the timings show it.
+
+    With a cache set, a report is only cached once output_results has consumed
+    all of it, and a cached report is handed to output_results as a single piece.
+    """
+
+    chunk_size = 1000
+
+    def prepare(self):
+        self.timings = {}
+        self.run_step(self.connect)
+        try:
+            self.run_step(self.construct_query)
+            if self.cache is not None and self.cache.load(self):
+                # Nothing left to read from the database
+                self.disconnect()
+                self.results = iter(self.results)
+                self.formatted_results = iter([self.formatted_results] if self.formatted_results else [])
+                return
+
+            self.run_step(self.do_query)
+            if self.cache is not None:
+                rows = []
+                self.results = self._collect(self.results, rows)
+            self.run_step(self.format_results)
+            if self.cache is not None:
+                self.formatted_results = self._store_when_consumed(self.formatted_results, rows)
+        except BaseException:
+            self.disconnect()
+            raise
+
+    def process_format(self):
+        self.prepare()
+        try:
+            self.run_step(self.output_results)
+        finally:
+            self.disconnect()
+
+    def do_query(self):
+        cursor = self.conn.execute(self.query, self.params)
+        self.results = self._fetch_chunks(cursor)
+
+    def _fetch_chunks(self, cursor):
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            yield from rows
+
+    def _collect(self, rows, collected):
+        for row in rows:
+            collected.append(row)
+            yield row
+
+    def _store_when_consumed(self, pieces, rows):
+        formatted = []
+        for piece in pieces:
+            formatted.append(piece)
+            yield piece
+
+        # Only reached if output_results read every piece, so the cache never gets half a report
+        self.results = rows
+        self.formatted_results = "".join(formatted)
+        self.cache.store(self)
+
+    def format_results(self):
+        self.formatted_results = self._format_rows(self.results)
+
+    def _format_rows(self, rows):
+        # Put the separator in front of every line but the first, so the pieces
+        # concatenate to exactly what QueryTemplate.format_results would produce
+        separator = ""
+        for row in rows:
+            yield separator + ", ".join([str(i) for i in row])
+            separator = "\n"
+
+
+class StreamingUserGrossQuery(StreamingQueryTemplate, UserGrossQuery):
+    def output_results(self):
+        filename = f"gross_sales_{datetime.date.today().strftime('%Y%m%d')}.txt"
+        with open(filename, 'w') as outfile:
+            outfile.writelines(self.formatted_results)
+
+
+class ReportScheduler:
+    """
+    Runs a batch of reports side by side.
+
+    The query and format steps of every report run concurrently on a thread pool
+    of at most max_workers threads. Reports on the same database share a pool of
+    read only connections to it, their own pools are put back once they're done.
+    Then each report's output step runs exactly once, in the order the reports
+    were given, so printed reports don't interleave.
+
+    >>> _ = seed_database()
+    >>> scheduler = ReportScheduler([NewVehiclesQuery(), UserGrossQuery()])
+    >>> timings = scheduler.run()
+    Tim, 16000, 2010, Honda Fit, true
+    Gayle, 28000, 2009, Ford Mustang, true
+    Gayle, 50000, 2010, Lincoln Navigator, true
+    >>> sorted(timings[1])
+    ['connect', 'construct_query', 'do_query', 'format_results', 'output_results']
+    """
+
+    def __init__(self, reports, max_workers=4):
+        self.reports = list(reports)
+        self.max_workers = max_workers
+
+    def run(self):
+        """
+        Returns the per step timings, in seconds, of each report.
+
+        A report that fails doesn't stop the others, their outputs still run.
+        Once every report is done and has given back its connection, the first
+        error is raised.
+        """
+
+        own_pools = [report.pool for report in self.reports]
+        counts = collections.Counter(pool.database for pool in own_pools)
+        # Streaming reports keep their connection until their output step, so
+        # size the pools by reports rather than by workers to never run dry
+        pools = {database: ConnectionPool(database, size=count, read_only=True)
+                 for database, count in counts.items()}
+        for report, own_pool in zip(self.reports, own_pools):
+            report.pool = pools[own_pool.database]
+            report.timings = {}
+
+        import concurrent.futures
+
+        errors = []
+        try:
+            with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+                futures = [executor.submit(report.prepare) for report in self.reports]
+
+                for report, future in zip(self.reports, futures):
+                    try:
+                        future.result()
+                        report.run_step(report.output_results)
+                    except Exception as error:
+                        errors.append(error)
+                    finally:
+                        report.disconnect()
+        finally:
+            for report, own_pool in zip(self.reports, own_pools):
+                report.disconnect()
+                # Reports using the class's pool go back to it, rather than keeping a copy of it
+                if own_pool is getattr(type(report), "pool", None):
+                    del report.pool
+                else:
+                    report.pool = own_pool
+            # Connections still checked out now would be a bug in a report
+            self.leaked_connections = sum(pool.close() for pool in pools.values())
+
+        if errors:
+            raise errors[0]
+
+        return [report.timings for report in self.reports]
+
+
 if __name__ == "__main__":
-    # Prints the new vehicles
-    new_vehicles = NewVehiclesQuery()
-    new_vehicles.process_format()
-    new_vehicles.output_results()
-
-    # Writes gross amount for each person to a file
-    gross_amt = UserGrossQuery()
-    gross_amt.process_format()
-    gross_amt.output_results()
\ No newline at end of file
+    seed_database()
+
+    # Prints the new vehicles and writes gross amount for each person to a file
+    reports = [NewVehiclesQuery(), UserGrossQuery()]
+    timings = ReportScheduler(reports).run()
+
+    for report, report_timings in zip(reports, timings):
+        steps = ", ".join(f"{step} {seconds * 1000:.2f}ms" for step, seconds in report_timings.items())
+        print(f"{report.__class__.__name__}: {steps}")
\ No newline at end of file